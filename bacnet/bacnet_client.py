@@ -2,22 +2,51 @@
 """
 bacnet_client.py - Minimal BACnet client to read water tank properties
 and optionally clear alarm (binaryValue).
+The BACpypes core runs in a background thread; requests are awaited from asyncio.
 """
 
 import sys
+import asyncio
 import logging
-import argparse
 import configparser
+import argparse
+from threading import Thread
 from bacpypes.app import BIPSimpleApplication
 from bacpypes.local.device import LocalDeviceObject
-from bacpypes.core import run, stop
-from bacpypes.apdu import ReadPropertyRequest, WritePropertyRequest
-from bacpypes.primitivedata import Real
+from bacpypes.core import run, stop, deferred, enable_sleeping
+from bacpypes.iocb import IOCB
+from bacpypes.apdu import (
+    ReadPropertyRequest,
+    WritePropertyRequest,
+    ReadPropertyMultipleRequest,
+    ReadAccessSpecification,
+    PropertyReference,
+)
+from bacpypes.primitivedata import Real, Enumerated
 from bacpypes.constructeddata import Any
+from bacpypes.errors import DecodingError, InvalidTag
 
 logging.basicConfig(level=logging.INFO)
 log = logging.getLogger(__name__)
 
+
+def _set_future_result(fut, result):
+    """Resolve `fut` unless it has already been cancelled."""
+    if not fut.done():
+        fut.set_result(result)
+
+
+def _decode_value(property_value, datatype, obj_id):
+    """
+    Cast a response's propertyValue to `datatype` (e.g. Real for an analogValue,
+    Enumerated for a binaryValue), or log and return None if it holds another type.
+    """
+    try:
+        return property_value.cast_out(datatype)
+    except (InvalidTag, DecodingError) as e:
+        log.error(f"Cannot decode value of {obj_id} as {datatype.__name__}: {e}")
+        return None
+
 class WaterTankClient:
     def __init__(self, local_addr, local_device_id):
         self.local_device = LocalDeviceObject(
@@ -29,15 +58,28 @@ class WaterTankClient:
         )
         self.app = BIPSimpleApplication(self.local_device, local_addr)
 
-    def read_prop(self, target_addr, obj_type, obj_inst, prop_id):
+    async def _request(self, request):
+        """
+        Submit `request` on the BACpypes core thread and await its completed IOCB.
+        Several requests can be in flight at once, unlike a blocking iocb.wait().
+        """
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+
+        iocb = IOCB(request)
+        # The callback fires on the core thread; hand the IOCB back to the asyncio loop
+        iocb.add_callback(lambda cb: loop.call_soon_threadsafe(_set_future_result, fut, cb))
+        deferred(self.app.request_io, iocb)
+        return await fut
+
+    async def read_prop(self, target_addr, obj_type, obj_inst, prop_id, datatype=Real):
         request = ReadPropertyRequest(
             objectIdentifier=(obj_type, obj_inst),
             propertyIdentifier=prop_id
         )
         request.pduDestination = target_addr
 
-        iocb = self.app.request_io(request)
-        iocb.wait()
+        iocb = await self._request(request)
 
         if iocb.ioError:
             log.error(f"Read error: {iocb.ioError}")
@@ -48,14 +90,60 @@ class WaterTankClient:
             log.error("No response from server.")
             return None
 
-        # Try to cast to Real for analog objects
-        val = response.propertyValue.cast_out(Real)
-        if val is None:
-            # Could be binary
-            val = response.propertyValue
-        return val
+        return _decode_value(response.propertyValue, datatype, (obj_type, obj_inst))
 
-    def write_prop(self, target_addr, obj_type, obj_inst, prop_id, value):
+    async def read_props_multi(self, target_addr, specs, prop_id="presentValue"):
+        """
+        Read `prop_id` from several objects in a single ReadPropertyMultiple
+        request. `specs` is a list of (obj_type, obj_inst, datatype) tuples, where
+        datatype is what the value is decoded as (Real for analogValue, Enumerated
+        for binaryValue); returns a list of values in the same order (None for any
+        failed read or a value of another type).
+        If the device rejects ReadPropertyMultiple, falls back to concurrent
+        ReadProperty requests.
+        """
+        request = ReadPropertyMultipleRequest(
+            listOfReadAccessSpecs=[
+                ReadAccessSpecification(
+                    objectIdentifier=(obj_type, obj_inst),
+                    listOfPropertyReferences=[PropertyReference(propertyIdentifier=prop_id)]
+                )
+                for obj_type, obj_inst, _ in specs
+            ]
+        )
+        request.pduDestination = target_addr
+
+        iocb = await self._request(request)
+
+        if iocb.ioError:
+            log.warning(f"ReadPropertyMultiple error: {iocb.ioError}; falling back to ReadProperty")
+            return await asyncio.gather(*(
+                self.read_prop(target_addr, obj_type, obj_inst, prop_id, datatype)
+                for obj_type, obj_inst, datatype in specs
+            ))
+
+        response = iocb.ioResponse
+        if not response:
+            log.error("No response from server.")
+            return [None] * len(specs)
+
+        values = []
+        for access_result, (_, _, datatype) in zip(response.listOfReadAccessResults, specs):
+            read_result = access_result.listOfResults[0].readResult
+            if read_result.propertyAccessError:
+                log.error(
+                    f"Read error for {access_result.objectIdentifier}: "
+                    f"{read_result.propertyAccessError}"
+                )
+                values.append(None)
+                continue
+
+            values.append(
+                _decode_value(read_result.propertyValue, datatype, access_result.objectIdentifier)
+            )
+        return values
+
+    async def write_prop(self, target_addr, obj_type, obj_inst, prop_id, value):
         """
         Example for writing a Real value to an analog. 
         For binary, we also store a Real(0 or 1).
@@ -69,8 +157,7 @@ class WaterTankClient:
         request.propertyValue = val
         request.pduDestination = target_addr
 
-        iocb = self.app.request_io(request)
-        iocb.wait()
+        iocb = await self._request(request)
 
         if iocb.ioError:
             log.error(f"Write error: {iocb.ioError}")
@@ -102,32 +189,40 @@ def main():
 
     client = WaterTankClient(local_addr, device_id)
 
-    # Read the water level
-    level_val = client.read_prop(target_addr, "analogValue", level_id, "presentValue")
-    log.info(f"Water Level: {level_val}%")
-
-    # Read the water temperature
-    temp_val = client.read_prop(target_addr, "analogValue", temp_id, "presentValue")
-    log.info(f"Water Temp : {temp_val}C")
-
-    # Read the alarm state
-    alarm_val = client.read_prop(target_addr, "binaryValue", alarm_id, "presentValue")
-    log.info(f"Alarm State: {alarm_val} (1 = Active, 0 = Inactive)")
-
-    # Clear alarm if active and not read-only
-    if not args.read_only and alarm_val is not None:
-        try:
-            alarm_float = float(alarm_val)
-            if alarm_float == 1.0:
-                log.info("Alarm is active; attempting to clear it (write 0).")
-                success = client.write_prop(target_addr, "binaryValue", alarm_id, "presentValue", 0.0)
-                if success:
-                    log.info("Alarm cleared.")
-        except ValueError:
-            pass
-
-    # Done, shut down the BACpypes event loop
-    stop()
+    async def session():
+        # Read water level, temperature and alarm state in one round-trip
+        level_val, temp_val, alarm_val = await client.read_props_multi(target_addr, [
+            ("analogValue", level_id, Real),
+            ("analogValue", temp_id, Real),
+            # binaryValue presentValue is an enumeration: 1 = active, 0 = inactive
+            ("binaryValue", alarm_id, Enumerated),
+        ])
+        log.info(f"Water Level: {level_val}%")
+        log.info(f"Water Temp : {temp_val}C")
+        log.info(f"Alarm State: {alarm_val} (1 = Active, 0 = Inactive)")
+
+        # Clear alarm if active and not read-only
+        if not args.read_only and alarm_val is not None:
+            try:
+                alarm_float = float(alarm_val)
+                if alarm_float == 1.0:
+                    log.info("Alarm is active; attempting to clear it (write 0).")
+                    success = await client.write_prop(target_addr, "binaryValue", alarm_id, "presentValue", 0.0)
+                    if success:
+                        log.info("Alarm cleared.")
+            except ValueError:
+                pass
+
+    # Run the BACpypes core in its own thread so the asyncio loop stays free.
+    # Signal handlers can only be installed from the main thread, so skip them.
+    enable_sleeping()
+    Thread(target=run, kwargs={"sigterm": None, "sigusr1": None}, daemon=True).start()
+
+    try:
+        asyncio.run(session())
+    finally:
+        # Done, shut down the BACpypes event loop
+        stop()
 
 if __name__ == "__main__":
     sys.exit(main())
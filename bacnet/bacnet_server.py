@@ -7,19 +7,21 @@ bacnet_server.py - Minimal BACnet server simulating a water tank with:
 """
 
 import sys
+import signal
 import logging
-import argparse
 import configparser
-import time
-from threading import Thread
+import argparse
+import random
 from bacpypes.app import BIPSimpleApplication
 from bacpypes.local.device import LocalDeviceObject
 from bacpypes.core import run, stop
+from bacpypes.task import RecurringTask
 from bacpypes.object import AnalogValueObject, BinaryValueObject
 
 logging.basicConfig(level=logging.INFO)
 log = logging.getLogger(__name__)
 
+
 class WaterTank:
     """
     Simulates a water tank with a 'level', 'temperature', and possible alarm states.
@@ -32,16 +34,16 @@ class WaterTank:
         self.high_alarm = False
         self.low_alarm = False
 
-    def update_tank(self):
+    def update_tank(self, _uniform=random.uniform):
         """Randomly change level & temperature, then check alarms."""
-        import random
+        # (_uniform is bound as a default so each call uses a fast local lookup)
         # Level moves randomly
-        self.level += random.uniform(-1.0, 2.0)
+        self.level += _uniform(-1.0, 2.0)
         # Keep in 0-100 range
         self.level = max(0.0, min(100.0, self.level))
 
         # Slight temperature drift
-        self.temperature += random.uniform(-0.1, 0.1)
+        self.temperature += _uniform(-0.1, 0.1)
 
         # Check thresholds
         self.high_alarm = (self.level >= self.high_thresh)
@@ -52,6 +54,36 @@ class WaterTank:
             f"high_alarm={self.high_alarm}, low_alarm={self.low_alarm}"
         )
 
+class TankUpdateTask(RecurringTask):
+    """
+    Periodically updates the tank and syncs the BACnet objects.
+    Runs inside the BACpypes core loop, so it never races with APDU handling.
+    """
+    def __init__(self, tank, level_obj, temp_obj, alarm_obj, interval_ms=5000):
+        RecurringTask.__init__(self, interval_ms)
+        self.tank = tank
+        self.level_obj = level_obj
+        self.temp_obj = temp_obj
+        self.alarm_obj = alarm_obj
+        # Last values written to the BACnet objects
+        self.last_level = tank.level
+        self.last_temp = tank.temperature
+        self.last_alarm = 0
+        self.install_task()
+
+    def process_task(self):
+        self.tank.update_tank()
+        # Sync presentValue with tank state, skipping unchanged values so
+        # property-change/COV handling only runs when something moved
+        if abs(self.tank.level - self.last_level) > 1e-6:
+            self.level_obj.presentValue = self.last_level = self.tank.level
+        if abs(self.tank.temperature - self.last_temp) > 1e-6:
+            self.temp_obj.presentValue = self.last_temp = self.tank.temperature
+        alarm_active = self.tank.high_alarm or self.tank.low_alarm
+        new_alarm = 1 if alarm_active else 0
+        if new_alarm != self.last_alarm:
+            self.alarm_obj.presentValue = self.last_alarm = new_alarm
+
 def main():
     parser = argparse.ArgumentParser(description="BACnet Water Tank Server")
     parser.add_argument("--config", default="config.ini", help="Path to config file")
@@ -119,25 +151,22 @@ def main():
 
     log.info(f"Starting BACnet server at {address} (device_id={device_id})")
 
-    # Background thread to update tank & BACnet objects
-    def update_loop():
-        while True:
-            time.sleep(5)
-            tank.update_tank()
-            # Sync presentValue with tank state
-            level_obj.presentValue = tank.level
-            temp_obj.presentValue = tank.temperature
-            alarm_active = tank.high_alarm or tank.low_alarm
-            alarm_obj.presentValue = 1 if alarm_active else 0
+    # Recurring task to update tank & BACnet objects every 5s
+    update_task = TankUpdateTask(tank, level_obj, temp_obj, alarm_obj)
+
+    # Ctrl+C / SIGTERM ask the core loop to exit between tasks, rather than
+    # raising KeyboardInterrupt at an arbitrary point (e.g. mid tank update)
+    def on_shutdown_signal(signum, frame):
+        log.info(f"Received {signal.Signals(signum).name}, stopping BACnet server.")
+        stop()
 
-    Thread(target=update_loop, daemon=True).start()
+    signal.signal(signal.SIGINT, on_shutdown_signal)
 
     # Run the server event loop
     try:
-        run()
-    except KeyboardInterrupt:
-        log.info("Server interrupted by user")
+        run(sigterm=on_shutdown_signal)
     finally:
+        update_task.suspend_task()
         stop()
 
 if __name__ == "__main__":
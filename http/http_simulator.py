@@ -2,16 +2,26 @@
 """
 http_simulator.py
 A simple HTTP simulator using Flask that returns a JSON payload from an INI config.
+Served by waitress when run directly; set [server] workers to run several processes
+sharing the port via SO_REUSEPORT. It can also be run under any WSGI server, e.g.
+$ gunicorn --workers $(nproc) --worker-class gthread --reuse-port --bind 127.0.0.1:5000 http_simulator:app
 To test use: 
 $ curl http://127.0.0.1:5000/api/data
 """
 import logging
 import configparser
-import json
+import multiprocessing
+import os
+import random
+import signal
+import socket
+import sys
 import threading
 import time
 
-from flask import Flask, jsonify
+import orjson
+from flask import Flask, Response, jsonify
+from waitress import serve
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -22,42 +32,74 @@ app = Flask(__name__)
 # Global variables to store config
 HOST = "127.0.0.1"
 PORT = 5000
+THREADS = 8
+WORKERS = 1
 ENDPOINT = "/api/data"
 JSON_PAYLOAD = {"status": "OK"}  # default fallback
+# Serialized JSON_PAYLOAD and a version counter, rebuilt only when the payload changes
+_CACHED_RESPONSE = (b'{"status":"OK"}', 0)
+# Seconds between updates of JSON_PAYLOAD["value"]
+UPDATE_INTERVAL = 5
+_next_update = 0.0
+_update_lock = threading.Lock()
+_initialized = False
 
-def update_json_periodically():
-    import random
-    while True:
+
+def _refresh_cached_response():
+    """
+    Re-serialize JSON_PAYLOAD into _CACHED_RESPONSE after it has been changed.
+    """
+    global _CACHED_RESPONSE
+    _CACHED_RESPONSE = (orjson.dumps(JSON_PAYLOAD), _CACHED_RESPONSE[1] + 1)
+
+def update_json_if_due():
+    """
+    Randomize JSON_PAYLOAD["value"] at most once every UPDATE_INTERVAL seconds.
+    Called from the request path, so no background thread has to wake up for it.
+    """
+    global _next_update
+    if time.monotonic() < _next_update:
+        return
+    with _update_lock:
+        now = time.monotonic()
+        if now < _next_update:
+            return
         JSON_PAYLOAD["value"] = random.randint(0, 1000)
-        time.sleep(5)
+        _refresh_cached_response()
+        _next_update = now + UPDATE_INTERVAL
 
 def load_config():
     """
     Reads http_config.ini and sets global variables.
     """
-    global HOST, PORT, ENDPOINT, JSON_PAYLOAD
+    global HOST, PORT, THREADS, WORKERS, ENDPOINT, JSON_PAYLOAD
 
     config = configparser.ConfigParser()
     config.read("http_config.ini")
 
-    if not config.has_section("server"):
+    if "server" not in config:
         logger.warning("No [server] section found in http_config.ini, using defaults.")
     else:
         HOST = config["server"].get("host", "127.0.0.1")
         PORT = config["server"].getint("port", 5000)
+        THREADS = config["server"].getint("threads", 8)
+        # 0 means one worker process per CPU core
+        WORKERS = config["server"].getint("workers", 1) or os.cpu_count() or 1
         ENDPOINT = config["server"].get("endpoint", "/api/data")
 
-    if not config.has_section("json_data"):
+    if "json_data" not in config:
         logger.warning("No [json_data] section found in http_config.ini, using fallback JSON.")
     else:
         payload_str = config["json_data"].get("payload", '{"status": "OK"}')
         try:
             # Attempt to parse the string as JSON
-            JSON_PAYLOAD = json.loads(payload_str)
-        except json.JSONDecodeError:
+            JSON_PAYLOAD = orjson.loads(payload_str)
+        except orjson.JSONDecodeError:
             logger.error("Failed to parse 'payload' as valid JSON. Falling back to default.")
             JSON_PAYLOAD = {"status": "ERROR", "message": "Invalid JSON in config"}
 
+    _refresh_cached_response()
+
 
 @app.route("/", methods=["GET"])
 def root():
@@ -80,32 +122,84 @@ def health():
     return jsonify({"health": "ok"})
 
 
-@app.route("/api/data", methods=["GET"])  # We'll re-map dynamically below
 def default_api():
     """
-    Placeholder. We'll update the rule to match ENDPOINT after config load.
+    Main JSON endpoint. Registered at ENDPOINT by init() once the config is loaded.
+    Serves the pre-serialized payload instead of re-encoding it per request.
     """
-    return jsonify(JSON_PAYLOAD)
+    update_json_if_due()
+    return Response(_CACHED_RESPONSE[0], mimetype="application/json")
 
 
-def main():
+def init():
+    """
+    Load the config and register the main endpoint.
+    Runs once at import time so WSGI servers importing `app` get a ready application.
+    """
+    global _initialized
+    if _initialized:
+        return
+    _initialized = True
+
     load_config()
-    # Dynamically update the rule for the main JSON endpoint
-    # (Flask doesn't easily let us define routes with variables before the config is loaded.
-    #  So we create a placeholder route above, then re-map it here.)
-    view_func = app.view_functions["default_api"]
-    # Remove old rule ("/api/data") from the URL map
-    app.url_map._rules_by_endpoint["default_api"].clear()
-    # Add new rule from the config
-    app.add_url_rule(ENDPOINT, "default_api", view_func, methods=["GET"])
-
-    logger.info(f"Starting HTTP Simulator on {HOST}:{PORT}")
+    app.add_url_rule(ENDPOINT, "default_api", default_api, methods=["GET"])
+
+
+init()
+
+
+def _serve_worker(host, port, threads):
+    """
+    Worker process: bind its own SO_REUSEPORT listener on host:port and serve.
+    The kernel load-balances incoming connections across all workers' sockets.
+    Ctrl+C is left to the parent, which terminates and joins the workers.
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    try:
+        # Resolve host so an IPv6 address (e.g. "::1") gets an AF_INET6 socket
+        family, socktype, proto, _, sockaddr = socket.getaddrinfo(
+            host, port, type=socket.SOCK_STREAM, flags=socket.AI_PASSIVE
+        )[0]
+        sock = socket.socket(family, socktype, proto)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        sock.bind(sockaddr)
+    except OSError as e:
+        logger.error(f"Worker {os.getpid()} could not listen on {host}:{port}: {e}")
+        sys.exit(1)
+    serve(app, sockets=[sock], threads=threads)
+
+
+def main():
+    workers = WORKERS
+    if workers > 1 and not hasattr(socket, "SO_REUSEPORT"):
+        logger.warning("SO_REUSEPORT is not available on this platform, using a single worker.")
+        workers = 1
+
+    logger.info(f"Starting HTTP Simulator on {HOST}:{PORT} ({workers} worker(s) x {THREADS} threads)")
     logger.info(f"Serving JSON payload at endpoint: {ENDPOINT}")
-    app.run(host=HOST, port=PORT)
 
+    if workers == 1:
+        serve(app, host=HOST, port=PORT, threads=THREADS)
+        return
+
+    # Each worker keeps its own copy of the payload, which is simply
+    # re-randomized per process on the UPDATE_INTERVAL cadence.
+    procs = [
+        multiprocessing.Process(target=_serve_worker, args=(HOST, PORT, THREADS), daemon=True)
+        for _ in range(workers)
+    ]
+    for proc in procs:
+        proc.start()
+    try:
+        for proc in procs:
+            proc.join()
+    except KeyboardInterrupt:
+        logger.info("Received Ctrl+C, stopping workers.")
+        for proc in procs:
+            proc.terminate()
+        for proc in procs:
+            proc.join()
 
-if __name__ == "__main__":
-    thread = threading.Thread(target=update_json_periodically, daemon=True)
-    thread.start()
 
+if __name__ == "__main__":
     main()
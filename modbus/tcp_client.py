@@ -3,129 +3,178 @@
 modbus_client.py
 
 A Modbus client that polls DI, CO, HR, IR at a configurable interval.
+Over TCP the four reads of each poll cycle are issued concurrently; over
+serial RTU, which has no transaction ids, they are sent one after another.
 Configuration is read from 'modbus_config.ini'.
 """
 
+import asyncio
 import logging
 import configparser
-import time
 import sys
+import time
+from dataclasses import dataclass
 
-from pymodbus.client import ModbusTcpClient, ModbusSerialClient
+from pymodbus.client import AsyncModbusTcpClient, AsyncModbusSerialClient
 from pymodbus.exceptions import ModbusIOException
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
+@dataclass(slots=True, frozen=True)
+class ClientConfig:
+    """
+    Typed snapshot of the [client], [client_data] and [client_serial] settings.
+    Built once at startup so the poll loop only does plain attribute loads.
+    """
+    client_type: str
+    host: str
+    port: int
+    unit_id: int
+    poll_interval: int
+    coils_start: int
+    coils_count: int
+    discretes_start: int
+    discretes_count: int
+    hr_start: int
+    hr_count: int
+    ir_start: int
+    ir_count: int
+    serial_port: str
+    baudrate: int
+
+    @classmethod
+    def from_ini(cls, config):
+        client_cfg = config["client"]
+        data_cfg = config["client_data"]
+        return cls(
+            # Shared client params
+            client_type=client_cfg.get("client_type", "tcp").lower(),
+            host=client_cfg.get("host", "127.0.0.1"),
+            port=client_cfg.getint("port", 5020),
+            unit_id=client_cfg.getint("unit_id", 1),
+            poll_interval=client_cfg.getint("poll_interval", 5),
+            # Coils
+            coils_start=data_cfg.getint("coils_start_address", 0),
+            coils_count=data_cfg.getint("coils_count", 10),
+            # Discrete Inputs
+            discretes_start=data_cfg.getint("discretes_start_address", 0),
+            discretes_count=data_cfg.getint("discretes_count", 10),
+            # Holding Registers
+            hr_start=data_cfg.getint("holding_registers_start_address", 0),
+            hr_count=data_cfg.getint("holding_registers_count", 5),
+            # Input Registers
+            ir_start=data_cfg.getint("input_registers_start_address", 0),
+            ir_count=data_cfg.getint("input_registers_count", 5),
+            # Serial params (only used if client_type = "serial")
+            # [client_serial] may be left out entirely, hence the parser-level lookups
+            serial_port=config.get("client_serial", "port", fallback="/dev/ttyUSB1"),
+            baudrate=config.getint("client_serial", "baudrate", fallback=9600),
+        )
+
+
 def run_modbus_client():
-    # --- 1) Load the INI config ---
+    # --- 1)-3) Load the INI config into a typed snapshot (client params + data blocks) ---
     config = configparser.ConfigParser()
     config.read("modbus_config.ini")
-
-    # --- 2) Extract shared client params ---
-    client_type = config["client"].get("client_type", "tcp").lower()
-    host = config["client"].get("host", "127.0.0.1")
-    port = config["client"].getint("port", 5020)
-    unit_id = config["client"].getint("unit_id", 1)
-    poll_interval = config["client"].getint("poll_interval", 5)
-
-    # --- 3) Extract the data block configs ---
-    # Coils
-    coils_start = config["client_data"].getint("coils_start_address", 0)
-    coils_count = config["client_data"].getint("coils_count", 10)
-    # Discrete Inputs
-    discretes_start = config["client_data"].getint("discretes_start_address", 0)
-    discretes_count = config["client_data"].getint("discretes_count", 10)
-    # Holding Registers
-    hr_start = config["client_data"].getint("holding_registers_start_address", 0)
-    hr_count = config["client_data"].getint("holding_registers_count", 5)
-    # Input Registers
-    ir_start = config["client_data"].getint("input_registers_start_address", 0)
-    ir_count = config["client_data"].getint("input_registers_count", 5)
+    cfg = ClientConfig.from_ini(config)
 
     # --- 4) Initialize the client (TCP or Serial) ---
-    if client_type == "tcp":
-        logger.info(f"Connecting TCP Client to {host}:{port}")
-        client = ModbusTcpClient(host=host, port=port)
-    elif client_type == "serial":
-        serial_port = config["client_serial"].get("port", "/dev/ttyUSB1")
-        baudrate = config["client_serial"].getint("baudrate", 9600)
-        logger.info(f"Connecting Serial Client to {serial_port} at {baudrate} baud")
-        client = ModbusSerialClient(method="rtu", port=serial_port, baudrate=baudrate)
+    if cfg.client_type == "tcp":
+        logger.info(f"Connecting TCP Client to {cfg.host}:{cfg.port}")
+        client = AsyncModbusTcpClient(cfg.host, port=cfg.port)
+    elif cfg.client_type == "serial":
+        logger.info(f"Connecting Serial Client to {cfg.serial_port} at {cfg.baudrate} baud")
+        client = AsyncModbusSerialClient(method="rtu", port=cfg.serial_port, baudrate=cfg.baudrate)
     else:
-        logger.error(f"Unknown client type: {client_type}")
-        sys.exit(1)
-
-    if not client.connect():
-        logger.error("Failed to connect to the Modbus server.")
+        logger.error(f"Unknown client type: {cfg.client_type}")
         sys.exit(1)
 
-    logger.info(
-        "Polling DI, CO, HR, IR at the following settings:\n"
-        f"  * Coils: start={coils_start}, count={coils_count}\n"
-        f"  * Discretes: start={discretes_start}, count={discretes_count}\n"
-        f"  * Holding Regs: start={hr_start}, count={hr_count}\n"
-        f"  * Input Regs: start={ir_start}, count={ir_count}\n"
-        f"  * Poll Interval: {poll_interval}s\n"
-    )
-
-    # --- 5) Polling Loop ---
-    try:
-        while True:
-            # Read Coils (FC=1)
-            if coils_count > 0:
-                try:
-                    resp = client.read_coils(address=coils_start, count=coils_count)
-                    if resp.isError():
-                        logger.error(f"Error reading coils: {resp}")
-                    else:
-                        logger.info(f"Coils[{coils_start}..{coils_start+coils_count-1}] = {resp.bits}")
-                except ModbusIOException as ex:
-                    logger.error(f"Modbus IOException (coils): {ex}")
-
-            # Read Discrete Inputs (FC=2)
-            if discretes_count > 0:
-                try:
-                    resp = client.read_discrete_inputs(address=discretes_start, count=discretes_count)
-                    if resp.isError():
-                        logger.error(f"Error reading discrete inputs: {resp}")
-                    else:
-                        logger.info(f"Discretes[{discretes_start}..{discretes_start+discretes_count-1}] = {resp.bits}")
-                except ModbusIOException as ex:
-                    logger.error(f"Modbus IOException (discretes): {ex}")
-
-            # Read Holding Registers (FC=3)
-            if hr_count > 0:
-                try:
-                    resp = client.read_holding_registers(address=hr_start, count=hr_count)
-                    if resp.isError():
-                        logger.error(f"Error reading holding registers: {resp}")
+    # (name used in error logs, short name, label, read coroutine, start, count, response attribute)
+    reads = [
+        ("coils", "coils", "Coils", client.read_coils, cfg.coils_start, cfg.coils_count, "bits"),
+        ("discrete inputs", "discretes", "Discretes", client.read_discrete_inputs,
+         cfg.discretes_start, cfg.discretes_count, "bits"),
+        ("holding registers", "HR", "Holding Registers", client.read_holding_registers,
+         cfg.hr_start, cfg.hr_count, "registers"),
+        ("input registers", "IR", "Input Registers", client.read_input_registers,
+         cfg.ir_start, cfg.ir_count, "registers"),
+    ]
+    # Skip any block configured with count=0
+    reads = [read for read in reads if read[5] > 0]
+
+    async def read_all():
+        """
+        Run every configured read, returning one response (or exception) per read.
+        Modbus TCP tags each request with a transaction id, so the reads can be in
+        flight together; an RTU line carries one request at a time, so await them in turn.
+        """
+        if cfg.client_type == "tcp":
+            return await asyncio.gather(
+                *(read(address=start, count=count) for _, _, _, read, start, count, _ in reads),
+                return_exceptions=True,
+            )
+        results = []
+        for _, _, _, read, start, count, _ in reads:
+            try:
+                results.append(await read(address=start, count=count))
+            except ModbusIOException as e:
+                results.append(e)
+        return results
+
+    async def poll_loop():
+        await client.connect()
+        if not client.connected:
+            logger.error("Failed to connect to the Modbus server.")
+            sys.exit(1)
+
+        logger.info(
+            "Polling DI, CO, HR, IR at the following settings:\n"
+            f"  * Coils: start={cfg.coils_start}, count={cfg.coils_count}\n"
+            f"  * Discretes: start={cfg.discretes_start}, count={cfg.discretes_count}\n"
+            f"  * Holding Regs: start={cfg.hr_start}, count={cfg.hr_count}\n"
+            f"  * Input Regs: start={cfg.ir_start}, count={cfg.ir_count}\n"
+            f"  * Poll Interval: {cfg.poll_interval}s\n"
+        )
+
+        # --- 5) Polling Loop ---
+        # Absolute deadlines keep a steady period regardless of how long the reads take
+        deadline = time.monotonic() + cfg.poll_interval
+        try:
+            while True:
+                # Issue the CO (FC=1), DI (FC=2), HR (FC=3) and IR (FC=4) reads
+                results = await read_all()
+
+                for (name, short, label, _, start, count, attr), resp in zip(reads, results):
+                    if isinstance(resp, ModbusIOException):
+                        logger.error("Modbus IOException (%s): %s", short, resp)
+                    elif isinstance(resp, BaseException):
+                        raise resp
+                    elif resp.isError():
+                        logger.error("Error reading %s: %s", name, resp)
                     else:
-                        logger.info(f"Holding Registers[{hr_start}..{hr_start+hr_count-1}] = {resp.registers}")
-                except ModbusIOException as ex:
-                    logger.error(f"Modbus IOException (HR): {ex}")
-
-            # Read Input Registers (FC=4)
-            if ir_count > 0:
-                try:
-                    resp = client.read_input_registers(address=ir_start, count=ir_count)
-                    if resp.isError():
-                        logger.error(f"Error reading input registers: {resp}")
-                    else:
-                        logger.info(f"Input Registers[{ir_start}..{ir_start+ir_count-1}] = {resp.registers}")
-                except ModbusIOException as ex:
-                    logger.error(f"Modbus IOException (IR): {ex}")
-
-            # Sleep for the poll_interval
-            logger.info(f"Sleeping for {poll_interval} seconds...\n")
-            time.sleep(poll_interval)
+                        # Lazy %-formatting: the bit/register list is only str()'d
+                        # when a handler actually emits the record
+                        logger.info("%s[%d..%d] = %s", label, start, start + count - 1, getattr(resp, attr))
+
+                # Sleep until the next poll slot
+                now = time.monotonic()
+                if now < deadline:
+                    logger.info("Sleeping for %.2f seconds...\n", deadline - now)
+                    await asyncio.sleep(deadline - now)
+                    deadline += cfg.poll_interval
+                else:
+                    # Overran the poll_interval; skip the missed slot
+                    deadline = now + cfg.poll_interval
+        finally:
+            client.close()
+            logger.info("Client connection closed.")
 
+    try:
+        asyncio.run(poll_loop())
     except KeyboardInterrupt:
         logger.info("Received Ctrl+C, shutting down client polling loop...")
-    finally:
-        client.close()
-        logger.info("Client connection closed.")
 
 
 if __name__ == "__main__":
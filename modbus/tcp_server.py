@@ -4,6 +4,7 @@ modbus_server.py
 Load settings from an INI config file, then run a Modbus server (TCP or Serial).
 """
 
+import array
 import logging
 import configparser
 
@@ -18,25 +19,56 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
+class ArrayDataBlock(ModbusSequentialDataBlock):
+    """
+    ModbusSequentialDataBlock backed by a compact array.array instead of a list.
+    Use typecode 'H' for 16-bit registers (hr/ir) and 'B' for bits (co/di).
+    """
+
+    def __init__(self, address, values, typecode="H"):
+        super().__init__(address, values)
+        self.values = array.array(typecode, values)
+
+    def reset(self):
+        self.values = array.array(self.values.typecode, [self.default_value] * len(self.values))
+
+    def getValues(self, address, count=1):
+        start = address - self.address
+        return self.values[start:start + count].tolist()
+
+    def setValues(self, address, values):
+        if not isinstance(values, (list, tuple)):
+            values = [values]
+        start = address - self.address
+        self.values[start:start + len(values)] = array.array(self.values.typecode, values)
+
+
 def run_modbus_server():
     # Read the INI config
     config = configparser.ConfigParser()
     config.read("modbus_config.ini")
 
     # Extract server parameters
-    server_type = config["server"].get("server_type", "tcp").lower()
-    host = config["server"].get("host", "127.0.0.1")
-    port = config["server"].getint("port", 5020)
-    single_mode_str = config["server"].get("single_slave_mode", "true")
+    server_cfg = config["server"]
+    server_type = server_cfg.get("server_type", "tcp").lower()
+    host = server_cfg.get("host", "127.0.0.1")
+    port = server_cfg.getint("port", 5020)
+    single_mode_str = server_cfg.get("single_slave_mode", "true")
     single_mode = single_mode_str.lower() == "true"
-    initial_value = config["server"].getint("initial_value", 0)
+    initial_value = server_cfg.getint("initial_value", 0)
+    # Register values must fit in uint16 (the 'H' arrays below reject anything else)
+    if not 0 <= initial_value <= 0xFFFF:
+        logger.error(f"initial_value must be between 0 and 65535, got {initial_value}")
+        return
     
-    # Create data blocks
+    # Create data blocks; coils and discrete inputs are single bits, so they
+    # only take whether initial_value is non-zero
+    initial_bit = int(bool(initial_value))
     store = ModbusSlaveContext(
-        di=ModbusSequentialDataBlock(0, [initial_value]*100),
-        co=ModbusSequentialDataBlock(0, [initial_value]*100),
-        hr=ModbusSequentialDataBlock(0, [initial_value]*100),
-        ir=ModbusSequentialDataBlock(0, [initial_value]*100),
+        di=ArrayDataBlock(0, [initial_bit]*100, typecode="B"),
+        co=ArrayDataBlock(0, [initial_bit]*100, typecode="B"),
+        hr=ArrayDataBlock(0, [initial_value]*100, typecode="H"),
+        ir=ArrayDataBlock(0, [initial_value]*100, typecode="H"),
     )
     context = ModbusServerContext(slaves=store, single=single_mode)
 
@@ -2,100 +2,114 @@
 """
 mqtt_pub.py
 A simple MQTT publisher that reads settings from 'mqtt_config.ini'.
-Publishes messages at a configurable interval.
+Publishes a retained message from an asyncio event loop (aiomqtt). Every
+publish_interval the [publisher] message_payload is re-read from the config;
+the payload is re-sent when it changes, plus a periodic heartbeat for liveness.
+A lost broker connection is re-established with exponential backoff.
 """
 
-import time
+import asyncio
 import logging
 import configparser
 import sys
+import time
 
-import paho.mqtt.client as mqtt
+import aiomqtt
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Upper bound in seconds for the wait between reconnect attempts
+MAX_RECONNECT_DELAY = 60
 
-def run_publisher():
+
+async def run_publisher():
     # 1) Load config
     config = configparser.ConfigParser()
     config.read("mqtt_config.ini")
 
-    if not config.has_section("mqtt_broker"):
+    if "mqtt_broker" not in config:
         logger.error("Missing [mqtt_broker] section in mqtt_config.ini")
         sys.exit(1)
 
     # Extract MQTT broker settings
-    broker_host = config["mqtt_broker"].get("host", "localhost")
-    broker_port = config["mqtt_broker"].getint("port", 1883)
-    username = config["mqtt_broker"].get("username", "")
-    password = config["mqtt_broker"].get("password", "")
-    clean_session_str = config["mqtt_broker"].get("clean_session", "true")
+    broker_cfg = config["mqtt_broker"]
+    broker_host = broker_cfg.get("host", "localhost")
+    broker_port = broker_cfg.getint("port", 1883)
+    username = broker_cfg.get("username", "")
+    password = broker_cfg.get("password", "")
+    clean_session_str = broker_cfg.get("clean_session", "true")
     clean_session = clean_session_str.lower() == "true"
 
-    qos = config["mqtt_broker"].getint("qos", 0)
-    publish_interval = config["mqtt_broker"].getint("publish_interval", 5)
+    qos = broker_cfg.getint("qos", 0)
+    publish_interval = broker_cfg.getint("publish_interval", 5)
 
-    if not config.has_section("publisher"):
+    if "publisher" not in config:
         logger.error("Missing [publisher] section in mqtt_config.ini")
         sys.exit(1)
 
     # Publisher section
     pub_topic = config["publisher"].get("topic", "my/test/topic")
-    message_payload = config["publisher"].get("message_payload", "Hello from MQTT Publisher!")
-
-    # 2) Create MQTT client
-    client = mqtt.Client(clean_session=clean_session)
-    
-    # Set username/password if provided
-    if username:
-        client.username_pw_set(username, password=password)
+    retain = config["publisher"].get("retain", "true").lower() == "true"
+    heartbeat_interval = config["publisher"].getint("heartbeat_interval", 60)
 
-    # 3) Define callbacks (optional)
-    def on_connect(client, userdata, flags, rc):
-        if rc == 0:
-            logger.info(f"Connected to MQTT broker at {broker_host}:{broker_port}")
-        else:
-            logger.error(f"Failed to connect, return code={rc}")
-
-    def on_publish(client, userdata, mid):
-        logger.info(f"Message ID {mid} published successfully")
-
-    client.on_connect = on_connect
-    client.on_publish = on_publish
-
-    # 4) Connect to broker
-    try:
+    # 2) Connect to broker, reconnecting with exponential backoff if the link drops
+    delay = 1
+    while True:
         logger.info(f"Connecting to {broker_host}:{broker_port}, clean_session={clean_session}, qos={qos}")
-        client.connect(broker_host, broker_port, keepalive=60)
-    except Exception as e:
-        logger.error(f"Error connecting to broker: {e}")
-        sys.exit(1)
+        try:
+            async with aiomqtt.Client(
+                broker_host,
+                port=broker_port,
+                username=username or None,
+                password=password or None,
+                clean_session=clean_session,
+                keepalive=60,
+                logger=logger,
+            ) as client:
+                logger.info(f"Connected to MQTT broker at {broker_host}:{broker_port}")
+                delay = 1
+
+                # 3) Check for changes every publish_interval; publish on change or heartbeat.
+                # With retain=True new subscribers still get the current value on connect.
+                # Absolute deadlines keep a steady period regardless of publish latency
+                deadline = time.monotonic() + publish_interval
+                last_payload = None
+                next_heartbeat = 0.0
+                while True:
+                    # Re-read the (small) config so edits to message_payload are picked up
+                    current = configparser.ConfigParser()
+                    current.read("mqtt_config.ini")
+                    message_payload = current.get(
+                        "publisher", "message_payload", fallback="Hello from MQTT Publisher!"
+                    )
+                    if message_payload != last_payload or time.monotonic() >= next_heartbeat:
+                        payload_bytes = message_payload.encode("utf-8")
+                        # For QoS 1/2 this returns once the broker has acknowledged the message
+                        await client.publish(pub_topic, payload_bytes, qos=qos, retain=retain)
+                        logger.info(
+                            f"Published '{message_payload}' to topic='{pub_topic}' QoS={qos} retain={retain}"
+                        )
+                        last_payload = message_payload
+                        next_heartbeat = time.monotonic() + heartbeat_interval
+
+                    now = time.monotonic()
+                    if now < deadline:
+                        await asyncio.sleep(deadline - now)
+                        deadline += publish_interval
+                    else:
+                        # Overran the publish_interval; skip the missed slot
+                        deadline = now + publish_interval
+        except aiomqtt.MqttError as e:
+            # Raised for a failed connect as well as for a publish or link failure mid-run;
+            # either way the client has been torn down, so start over on a fresh connection
+            logger.error(f"MQTT error: {e}; reconnecting in {delay}s")
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, MAX_RECONNECT_DELAY)
 
-    # 5) Start background network loop
-    client.loop_start()
 
-    # 6) Publish messages at intervals
+if __name__ == "__main__":
     try:
-        while True:
-            # Publish a message
-            result, mid = client.publish(pub_topic, message_payload, qos=qos)
-            if result == mqtt.MQTT_ERR_SUCCESS:
-                logger.info(f"Published '{message_payload}' to topic='{pub_topic}' QoS={qos}")
-            else:
-                logger.error(f"Failed to publish message: {result}")
-
-            time.sleep(publish_interval)
-
+        asyncio.run(run_publisher())
     except KeyboardInterrupt:
         logger.info("Publisher stopped by user (Ctrl+C).")
-
-    finally:
-        # 7) Clean up
-        client.loop_stop()
-        client.disconnect()
-        logger.info("MQTT publisher disconnected.")
-
-
-if __name__ == "__main__":
-    run_publisher()
@@ -2,83 +2,89 @@
 """
 mqtt_sub.py
 A simple MQTT subscriber that reads settings from 'mqtt_config.ini'.
-Subscribes to a given topic and logs incoming messages.
+Subscribes to a given topic from an asyncio event loop (aiomqtt) and logs incoming messages.
+A lost broker connection is re-established, and the topic re-subscribed, with exponential backoff.
+Set the LOG_LEVEL environment variable (e.g. LOG_LEVEL=WARNING) to change verbosity.
 """
 
+import asyncio
 import logging
 import configparser
+import os
 import sys
 
-import paho.mqtt.client as mqtt
+import aiomqtt
 
-logging.basicConfig(level=logging.INFO)
+logging.basicConfig(level=os.environ.get("LOG_LEVEL", "INFO").upper())
 logger = logging.getLogger(__name__)
 
+# Upper bound in seconds for the wait between reconnect attempts
+MAX_RECONNECT_DELAY = 60
 
-def run_subscriber():
+
+async def run_subscriber():
     # 1) Load config
     config = configparser.ConfigParser()
     config.read("mqtt_config.ini")
 
-    if not config.has_section("mqtt_broker"):
+    if "mqtt_broker" not in config:
         logger.error("Missing [mqtt_broker] section in mqtt_config.ini")
         sys.exit(1)
 
     # Extract MQTT broker settings
-    broker_host = config["mqtt_broker"].get("host", "localhost")
-    broker_port = config["mqtt_broker"].getint("port", 1883)
-    username = config["mqtt_broker"].get("username", "")
-    password = config["mqtt_broker"].get("password", "")
-    clean_session_str = config["mqtt_broker"].get("clean_session", "true")
+    broker_cfg = config["mqtt_broker"]
+    broker_host = broker_cfg.get("host", "localhost")
+    broker_port = broker_cfg.getint("port", 1883)
+    username = broker_cfg.get("username", "")
+    password = broker_cfg.get("password", "")
+    clean_session_str = broker_cfg.get("clean_session", "true")
     clean_session = clean_session_str.lower() == "true"
 
-    qos = config["mqtt_broker"].getint("qos", 0)
+    qos = broker_cfg.getint("qos", 0)
 
-    if not config.has_section("subscriber"):
+    if "subscriber" not in config:
         logger.error("Missing [subscriber] section in mqtt_config.ini")
         sys.exit(1)
 
     # Subscriber section
     sub_topic = config["subscriber"].get("topic", "my/test/topic")
 
-    # 2) Create MQTT client
-    client = mqtt.Client(clean_session=clean_session)
-
-    # Set username/password if provided
-    if username:
-        client.username_pw_set(username, password=password)
-
-    # 3) Define callbacks
-    def on_connect(client, userdata, flags, rc):
-        if rc == 0:
-            logger.info(f"Connected to MQTT broker at {broker_host}:{broker_port}, subscribing to '{sub_topic}'")
-            client.subscribe(sub_topic, qos=qos)
-        else:
-            logger.error(f"Failed to connect, return code={rc}")
-
-    def on_message(client, userdata, msg):
-        logger.info(f"Received message on topic='{msg.topic}': {msg.payload.decode('utf-8')}")
-
-    client.on_connect = on_connect
-    client.on_message = on_message
-
-    # 4) Connect to broker
-    try:
+    # 2) Connect to broker, reconnecting (and re-subscribing) with exponential
+    # backoff if the link drops
+    delay = 1
+    while True:
         logger.info(f"Connecting to {broker_host}:{broker_port}, clean_session={clean_session}, qos={qos}")
-        client.connect(broker_host, broker_port, keepalive=60)
-    except Exception as e:
-        logger.error(f"Error connecting to broker: {e}")
-        sys.exit(1)
+        try:
+            async with aiomqtt.Client(
+                broker_host,
+                port=broker_port,
+                username=username or None,
+                password=password or None,
+                clean_session=clean_session,
+                keepalive=60,
+                # Route aiomqtt/paho log output through our logging config
+                logger=logger,
+            ) as client:
+                logger.info(f"Connected to MQTT broker at {broker_host}:{broker_port}, subscribing to '{sub_topic}'")
+                await client.subscribe(sub_topic, qos=qos)
+                delay = 1
+
+                # 3) Handle incoming messages
+                async for msg in client.messages:
+                    # Skip the decode and formatting entirely when INFO records would be dropped
+                    if logger.isEnabledFor(logging.INFO):
+                        logger.info("Received message on topic='%s': %s",
+                                    msg.topic, msg.payload.decode("utf-8", errors="replace"))
+        except aiomqtt.MqttError as e:
+            # Raised for a failed connect as well as for a link lost mid-run; either
+            # way the client has been torn down, so start over on a fresh connection
+            logger.error(f"MQTT error: {e}; reconnecting in {delay}s")
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, MAX_RECONNECT_DELAY)
+
 
-    # 5) Blocking network loop
+if __name__ == "__main__":
     try:
-        client.loop_forever()
+        asyncio.run(run_subscriber())
     except KeyboardInterrupt:
         logger.info("Subscriber stopped by user (Ctrl+C).")
-    finally:
-        client.disconnect()
-        logger.info("MQTT subscriber disconnected.")
-
-
-if __name__ == "__main__":
-    run_subscriber()
@@ -7,6 +7,7 @@ Subscribes to a given topic and logs incoming messages.
 
 import logging
 import configparser
+import operator
 import sys
 
 import paho.mqtt.client as mqtt
@@ -16,27 +17,37 @@ from sparkplug_b import sparkplug_b_pb2 as spb
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Metric value field for each supported Sparkplug B datatype, so decoding a
+# metric is one dict lookup instead of a chain of comparisons
+_ACCESS = {
+    spb.String: operator.attrgetter("string_value"),
+    spb.Int32: operator.attrgetter("int_value"),
+    spb.Float: operator.attrgetter("float_value"),
+    spb.Boolean: operator.attrgetter("boolean_value"),
+}
+
 
 def run_subscriber():
     # 1) Load config
     config = configparser.ConfigParser()
     config.read("mqtt_config.ini")
 
-    if not config.has_section("mqtt_broker"):
+    if "mqtt_broker" not in config:
         logger.error("Missing [mqtt_broker] section in mqtt_config.ini")
         sys.exit(1)
 
     # Extract MQTT broker settings
-    broker_host = config["mqtt_broker"].get("host", "localhost")
-    broker_port = config["mqtt_broker"].getint("port", 1883)
-    username = config["mqtt_broker"].get("username", "")
-    password = config["mqtt_broker"].get("password", "")
-    clean_session_str = config["mqtt_broker"].get("clean_session", "true")
+    broker_cfg = config["mqtt_broker"]
+    broker_host = broker_cfg.get("host", "localhost")
+    broker_port = broker_cfg.getint("port", 1883)
+    username = broker_cfg.get("username", "")
+    password = broker_cfg.get("password", "")
+    clean_session_str = broker_cfg.get("clean_session", "true")
     clean_session = clean_session_str.lower() == "true"
 
-    qos = config["mqtt_broker"].getint("qos", 0)
+    qos = broker_cfg.getint("qos", 0)
 
-    if not config.has_section("subscriber"):
+    if "subscriber" not in config:
         logger.error("Missing [subscriber] section in mqtt_config.ini")
         sys.exit(1)
 
@@ -86,16 +97,10 @@ def run_subscriber():
         # 4) Look at the Metrics
         for metric in sparkplug_msg.metrics:
             metric_name = metric.name
-            metric_type = metric.datatype  # e.g., 0=Invalid, 1=Float, 2=Double, etc.
             # Depending on the datatype, retrieve the appropriate value
-            if metric.datatype == spb.Payload.Metric.STRING:
-                val = metric.string_value
-            elif metric.datatype == spb.Payload.Metric.INT32:
-                val = metric.int_value
-            elif metric.datatype == spb.Payload.Metric.FLOAT:
-                val = metric.float_value
-            elif metric.datatype == spb.Payload.Metric.BOOLEAN:
-                val = metric.boolean_value
+            access = _ACCESS.get(metric.datatype)
+            if access is not None:
+                val = access(metric)
             else:
                 # Catch-all for other Sparkplug data types
                 val = f"Unsupported datatype: {metric.datatype}"
@@ -0,0 +1,33 @@
+"""
+nodeid.py
+NodeId string parsing shared by opcua_server.py (asyncua) and opcua_client.py
+(python-opcua); each script builds its own library's NodeId from the parts.
+"""
+import re
+
+# 'ns=<index>;<type>=<identifier>', read the way the original split(";") parser did:
+# whitespace around the index is allowed, the identifier ends at the next ';'
+# (anything after it is ignored), and an unknown/missing type prefix is kept
+# as part of a string id
+_NODEID_RE = re.compile(r"\s*ns\s*=\s*(\d+)\s*;(?:([sib])=)?([^;]*)(?:;.*)?", re.DOTALL)
+# Type prefix -> (NodeIdType member name, identifier conversion)
+_NODEID_TYPES = {
+    "s": ("String", str),
+    "i": ("Numeric", int),
+    "b": ("ByteString", str),
+    None: ("String", str),
+}
+
+
+def split_nodeid(nodeid_str):
+    """
+    Split a string like 'ns=2;s="Pressure"' into (namespace index, NodeIdType
+    member name, identifier), e.g. (2, "String", '"Pressure"').
+    Also accepts ns=3;i=1001 (integer-based) or ns=2;b=BASE64...
+    """
+    match = _NODEID_RE.fullmatch(nodeid_str)
+    if match is None:
+        raise ValueError(f"Invalid NodeId string: {nodeid_str!r}")
+    ns_idx, id_type, identifier = match.groups()
+    type_name, convert = _NODEID_TYPES[id_type]
+    return int(ns_idx), type_name, convert(identifier)
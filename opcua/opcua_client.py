@@ -6,6 +6,7 @@ and log the results.
 """
 import logging
 import configparser
+import functools
 import time
 import sys
 
@@ -13,27 +14,19 @@ from opcua import Client
 from opcua.ua import NodeId, NodeIdType
 from opcua import ua
 
+from nodeid import split_nodeid
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
+@functools.lru_cache(maxsize=32)
 def parse_nodeid(nodeid_str):
     """
-    Convert a string like 'ns=2;s="Pressure"' into an actual NodeId object.
-    (Same helper as in the server script, so we can interpret IDs from config.)
+    Convert a string like 'ns=2;s="Pressure"' into a python-opcua NodeId object.
     """
-    parts = nodeid_str.split(";")
-    ns_part = parts[0]  # e.g. ns=2
-    id_part = parts[1]  # e.g. s=Something
-    ns_idx = int(ns_part.split("=")[1])
-    if id_part.startswith("s="):
-        return NodeId(id_part.split("=", 1)[1], ns_idx, NodeIdType.String)
-    elif id_part.startswith("i="):
-        return NodeId(int(id_part.split("=", 1)[1]), ns_idx, NodeIdType.Numeric)
-    elif id_part.startswith("b="):
-        return NodeId(id_part.split("=", 1)[1], ns_idx, NodeIdType.ByteString)
-    else:
-        return NodeId(id_part, ns_idx, NodeIdType.String)
+    ns_idx, type_name, identifier = split_nodeid(nodeid_str)
+    return NodeId(identifier, ns_idx, getattr(NodeIdType, type_name))
 
 
 def run_opcua_client():
@@ -62,10 +55,14 @@ def run_opcua_client():
         logger.error(f"Failed to connect to server: {e}")
         sys.exit(1)
 
-    # --- 3) Obtain Node objects ---
-    node1 = client.get_node(node1_id)
-    node2 = client.get_node(node2_id)
-    node3 = client.get_node(node3_id)
+    # --- 3) Build a single Read request covering all three nodes ---
+    # The request shape never changes, so it is built once and reused every poll.
+    read_params = ua.ReadParameters()
+    for nid in (node1_id, node2_id, node3_id):
+        rv = ua.ReadValueId()
+        rv.NodeId = nid
+        rv.AttributeId = ua.AttributeIds.Value
+        read_params.NodesToRead.append(rv)
 
     logger.info(
         "Polling variables:\n"
@@ -76,11 +73,18 @@ def run_opcua_client():
     )
 
     # --- 4) Polling Loop ---
+    # Absolute deadlines keep a steady period regardless of read latency
+    deadline = time.monotonic() + poll_interval
     try:
         while True:
-            val1 = node1.get_value()
-            val2 = node2.get_value()
-            val3 = node3.get_value()
+            # One Read service round-trip for all nodes
+            results = client.uaclient.read(read_params)
+            # Unlike Node.get_value(), a batched Read does not raise for a bad
+            # node, so report each failed result's status before unpacking
+            for id_str, r in zip((node1_id_str, node2_id_str, node3_id_str), results):
+                if not r.StatusCode.is_good():
+                    logger.error(f"Read of {id_str} failed: {r.StatusCode.name}")
+            val1, val2, val3 = (r.Value.Value for r in results)
 
             logger.info(
                 f"Read values: "
@@ -89,7 +93,13 @@ def run_opcua_client():
                 f"{node3_id_str}={val3}"
             )
 
-            time.sleep(poll_interval)
+            now = time.monotonic()
+            if now < deadline:
+                time.sleep(deadline - now)
+                deadline += poll_interval
+            else:
+                # Overran the poll_interval; skip the missed slot
+                deadline = now + poll_interval
 
     except KeyboardInterrupt:
         logger.info("Received Ctrl+C, shutting down client.")
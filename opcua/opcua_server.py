@@ -2,125 +2,169 @@
 """
 opcua_server.py
 Create an OPC UA server, configure nodes/variables, and optionally update them in a loop.
+Built on asyncua, so client sessions are served while the update loop awaits its next tick.
 """
-import time
+import asyncio
 import logging
 import configparser
-from configparser import ConfigParser, ExtendedInterpolation
-from opcua import ua, Server
+import functools
+import time
+from datetime import datetime, timezone
+from asyncua import ua, Server
+from asyncua.ua import NodeId, NodeIdType
+from asyncua.common.callback import CallbackType
+
+from nodeid import split_nodeid
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
-def run_opcua_server():
+@functools.lru_cache(maxsize=32)
+def parse_nodeid(nodeid_str):
+    """
+    Convert a string like 'ns=2;s="Pressure"' into an asyncua NodeId object.
+    E.g. NodeId("Pressure", 2, NodeIdType.String)
+    """
+    ns_idx, type_name, identifier = split_nodeid(nodeid_str)
+    return NodeId(identifier, ns_idx, getattr(NodeIdType, type_name))
+
+
+class SubHandler:
+    """
+    Subscription handler: logs variable changes pushed by the server's own
+    subscription, so the update loop doesn't have to read values back.
+    """
+    def __init__(self, names):
+        self.names = names  # NodeId -> variable name
+
+    def datachange_notification(self, node, val, data):
+        logger.info(f"Updated {self.names.get(node.nodeid, node)}={val}")
+
+
+async def run_opcua_server():
     # --- 1) Load INI config ---
-    config = configparser.ConfigParser(interpolation=ExtendedInterpolation())
+    config = configparser.ConfigParser(interpolation=configparser.ExtendedInterpolation())
     config.read("opcua_config.ini")
-    
-    server_endpoint = config["server"].get("endpoint", "opc.tcp://127.0.0.1:4840")
-    namespace_uri = config["server"].get("namespace_uri", "http://examples.freeopcua.github.io")
-    server_name = config["server"].get("server_name", "MyOpcUaServer")
-    server_loop_time = config["server"].getint("server_loop_time", 1)
+
+    server_cfg = config["server"]
+    server_endpoint = server_cfg.get("endpoint", "opc.tcp://127.0.0.1:4840")
+    namespace_uri = server_cfg.get("namespace_uri", "http://examples.freeopcua.github.io")
+    server_name = server_cfg.get("server_name", "MyOpcUaServer")
+    server_loop_time = server_cfg.getint("server_loop_time", 1)
 
     # Node definitions
-    node1_name = config["variables"].get("node1_name", "Variable1")
-    node1_nodeid = config["variables"].get("node1_nodeid", "ns=2;s=Var1")
-    node1_init = config["variables"].getfloat("node1_initial_value", 0.0)
+    var_cfg = config["variables"]
+    node1_name = var_cfg.get("node1_name", "Variable1")
+    node1_nodeid = var_cfg.get("node1_nodeid", "ns=2;s=Var1")
+    node1_init = var_cfg.getfloat("node1_initial_value", 0.0)
 
-    node2_name = config["variables"].get("node2_name", "Variable2")
-    node2_nodeid = config["variables"].get("node2_nodeid", "ns=2;s=Var2")
-    node2_init = config["variables"].getfloat("node2_initial_value", 0.0)
+    node2_name = var_cfg.get("node2_name", "Variable2")
+    node2_nodeid = var_cfg.get("node2_nodeid", "ns=2;s=Var2")
+    node2_init = var_cfg.getfloat("node2_initial_value", 0.0)
 
-    node3_name = config["variables"].get("node3_name", "Variable3")
-    node3_nodeid = config["variables"].get("node3_nodeid", "ns=2;s=Var3")
-    node3_init = config["variables"].getfloat("node3_initial_value", 0.0)
+    node3_name = var_cfg.get("node3_name", "Variable3")
+    node3_nodeid = var_cfg.get("node3_nodeid", "ns=2;s=Var3")
+    node3_init = var_cfg.getfloat("node3_initial_value", 0.0)
 
     # --- 2) Create Server Instance ---
     server = Server()
+    await server.init()
     server.set_endpoint(server_endpoint)
     server.set_server_name(server_name)
 
     # Register a new namespace
-    idx = server.register_namespace(namespace_uri)
+    idx = await server.register_namespace(namespace_uri)
     logger.info(f"Namespace={namespace_uri} registered with index={idx}")
 
     # --- 3) Create an object to hold our variables ---
     #   We create one "Device" object with our example variables
-    objects_node = server.get_objects_node()
-    device_obj = objects_node.add_object(idx, "Device")
+    objects_node = server.nodes.objects
+    device_obj = await objects_node.add_object(idx, "Device")
 
     # Now add each variable with its custom NodeId
-    # parse_nodeid will turn "ns=2;s=VarName" into an object python-opcua can use
-    from opcua.ua import NodeId, NodeIdType
-
-    def parse_nodeid(nodeid_str):
-        """
-        Convert a string like 'ns=2;s="Pressure"' into an actual NodeId object.
-        E.g. NodeId("Pressure", 2, NodeIdType.String)
-        """
-        # Typically nodeid_str looks like: ns=2;s=Pressure
-        # or ns=3;i=1001 (integer-based) or ns=2;b=BASE64...
-        # We'll do a quick parse for "ns=" and "s=" or "i=" or "b="
-        # For simplicity, we assume 'ns=2;s=Something'
-        parts = nodeid_str.split(";")
-        ns_part = parts[0]  # e.g. ns=2
-        id_part = parts[1]  # e.g. s=Something
-        ns_idx = int(ns_part.split("=")[1])
-        if id_part.startswith("s="):
-            return NodeId(id_part.split("=", 1)[1], ns_idx, NodeIdType.String)
-        elif id_part.startswith("i="):
-            return NodeId(int(id_part.split("=", 1)[1]), ns_idx, NodeIdType.Numeric)
-        elif id_part.startswith("b="):
-            return NodeId(id_part.split("=", 1)[1], ns_idx, NodeIdType.ByteString)
-        else:
-            # fallback to string if unknown
-            return NodeId(id_part, ns_idx, NodeIdType.String)
-
+    # parse_nodeid will turn "ns=2;s=VarName" into an object asyncua can use
     v1_nodeid = parse_nodeid(node1_nodeid)
     v2_nodeid = parse_nodeid(node2_nodeid)
     v3_nodeid = parse_nodeid(node3_nodeid)
 
-    var1 = device_obj.add_variable(v1_nodeid, node1_name, node1_init)
-    var2 = device_obj.add_variable(v2_nodeid, node2_name, node2_init)
-    var3 = device_obj.add_variable(v3_nodeid, node3_name, node3_init)
+    var1 = await device_obj.add_variable(v1_nodeid, node1_name, node1_init)
+    var2 = await device_obj.add_variable(v2_nodeid, node2_name, node2_init)
+    var3 = await device_obj.add_variable(v3_nodeid, node3_name, node3_init)
 
     # Set variables as writable (optional)
-    var1.set_writable()
-    var2.set_writable()
-    var3.set_writable()
+    await var1.set_writable()
+    await var2.set_writable()
+    await var3.set_writable()
 
     # --- 4) Start Server ---
     logger.info(f"Starting OPC UA server at {server_endpoint} with name={server_name}")
-    server.start()
+    await server.start()
     logger.info("Server started.")
 
+    # Log value changes from a subscription instead of reading them back each tick
+    handler = SubHandler({v1_nodeid: node1_name, v2_nodeid: node2_name, v3_nodeid: node3_name})
+    sub = await server.create_subscription(server_loop_time * 1000, handler)
+    await sub.subscribe_data_change([var1, var2, var3])
+
+    # In-Python mirror of the three values, so the loop never reads them back.
+    # The loop is the only writer apart from clients, whose writes are folded in here.
+    cur = [node1_init, node2_init, node3_init]
+    mirror_index = {v1_nodeid: 0, v2_nodeid: 1, v3_nodeid: 2}
+
+    def on_post_write(event, dispatcher):
+        if not event.is_external:
+            return
+        for wv, status in zip(event.request_params.NodesToWrite, event.response_params):
+            i = mirror_index.get(wv.NodeId)
+            if i is not None and wv.AttributeId == ua.AttributeIds.Value and status.is_good():
+                cur[i] = float(wv.Value.Value.Value)
+
+    server.subscribe_server_callback(CallbackType.PostWrite, on_post_write)
+
+    # One Write service request per tick covers all three variables
+    write_params = ua.WriteParameters()
+    for nid in (v1_nodeid, v2_nodeid, v3_nodeid):
+        wv = ua.WriteValue()
+        wv.NodeId = nid
+        wv.AttributeId = ua.AttributeIds.Value
+        write_params.NodesToWrite.append(wv)
+
     # --- 5) Optional Loop to update variable values ---
+    # Absolute deadlines keep a steady period regardless of write latency
+    deadline = time.monotonic() + server_loop_time
     try:
         while True:
             # Example: increment or modify the variables in some way
-            current_v1 = var1.get_value()
-            current_v2 = var2.get_value()
-            current_v3 = var3.get_value()
-
-            var1.set_value(current_v1 + 1.0)
-            var2.set_value(current_v2 + 0.5)
-            var3.set_value((current_v3 + 1) % 5)  # cycles between 0..4
-
-            logger.info(
-                f"Updated {node1_name}={var1.get_value()}, "
-                f"{node2_name}={var2.get_value()}, "
-                f"{node3_name}={var3.get_value()}"
-            )
+            cur[0] += 1.0
+            cur[1] += 0.5
+            cur[2] = (cur[2] + 1) % 5  # cycles between 0..4
+
+            now = datetime.now(timezone.utc)
+            for wv, val in zip(write_params.NodesToWrite, cur):
+                wv.Value = ua.DataValue(ua.Variant(val, ua.VariantType.Double), SourceTimestamp=now)
+
+            results = await server.iserver.isession.write(write_params)
+            for wv, status in zip(write_params.NodesToWrite, results):
+                if not status.is_good():
+                    logger.warning(f"Write to {wv.NodeId} failed: {status}")
+
+            now = time.monotonic()
+            if now < deadline:
+                await asyncio.sleep(deadline - now)
+                deadline += server_loop_time
+            else:
+                # Overran the server_loop_time; skip the missed slot
+                deadline = now + server_loop_time
 
-            time.sleep(server_loop_time)
-
-    except KeyboardInterrupt:
-        logger.info("Received Ctrl+C, shutting down OPC UA server.")
     finally:
-        server.stop()
+        await sub.delete()
+        await server.stop()
         logger.info("Server stopped.")
 
 
 if __name__ == "__main__":
-    run_opcua_server()
+    try:
+        asyncio.run(run_opcua_server())
+    except KeyboardInterrupt:
+        logger.info("Received Ctrl+C, shutting down OPC UA server.")
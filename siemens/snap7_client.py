@@ -3,85 +3,368 @@
 snap7_client.py
 A Snap7 client that connects to a Snap7 server (simulated PLC),
 reads/writes data at a configurable interval.
+Each configured PLC is polled by its own asyncio task through a small pool of
+connections; the blocking libsnap7 calls run on a per-connection worker thread,
+so several PLCs, and several requests to one PLC, are served concurrently.
 """
+import asyncio
+import ctypes
 import logging
 import configparser
 import sys
 import time
+from concurrent.futures import ThreadPoolExecutor
 
 import snap7
-from snap7.util import get_byte, set_byte
+from snap7.type import Area, WordLen, S7DataItem, Parameter
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
-def run_snap7_client():
-    # --- 1) Load config ---
-    config = configparser.ConfigParser()
-    config.read("snap7_config.ini")
+# S7 limit on the number of items in one multi-variable read request
+MAX_VARS_PER_READ = 20
+# Read telegram overheads (bytes) counted against the negotiated PDU length:
+# request header + one 12-byte address per item; response header + a 4-byte
+# header per item, whose data is padded to an even length
+READ_REQUEST_HEADER = 19
+READ_REQUEST_ITEM = 12
+READ_RESPONSE_HEADER = 14
+READ_RESPONSE_ITEM = 4
 
-    if not config.has_section("snap7_client"):
-        logger.error("Missing [snap7_client] section in snap7_config.ini")
-        sys.exit(1)
 
-    ip = config["snap7_client"].get("ip", "127.0.0.1")
-    tcpport = config["snap7_client"].getint("tcpport", 1102)
-    rack = config["snap7_client"].getint("rack", 0)
-    slot = config["snap7_client"].getint("slot", 1)
-    db_number = config["snap7_client"].getint("db_number", 1)
-    start = config["snap7_client"].getint("start", 0)
-    size = config["snap7_client"].getint("size", 10)
-    poll_interval = config["snap7_client"].getint("poll_interval", 5)
+def parse_read_specs(value):
+    """
+    Parse 'db:start:size, db:start:size, ...' into a list of (db, start, size) tuples.
+    """
+    specs = []
+    for part in value.split(","):
+        part = part.strip()
+        if part:
+            db, start, size = (int(x) for x in part.split(":"))
+            specs.append((db, start, size))
+    return specs
+
+
+def _make_batch(pieces, buffers):
+    """
+    Build the S7DataItem array for one read_multi_vars() call. Each item points
+    straight into its range's bytearray (at the piece's offset), so no copy is made.
+    """
+    items = (S7DataItem * len(pieces))()
+    owners = []
+    for item, (idx, db, start, offset, amount) in zip(items, pieces):
+        item.Area = Area.DB
+        item.WordLen = WordLen.Byte
+        item.Result = 0
+        item.DBNumber = db
+        item.Start = start
+        item.Amount = amount
+        view = (ctypes.c_uint8 * amount).from_buffer(buffers[idx], offset)
+        item.pData = ctypes.cast(view, ctypes.POINTER(ctypes.c_uint8))
+        owners.append(idx)
+    return items, owners
+
+
+def build_read_batches(specs, pdu_length):
+    """
+    Plan multi-variable reads for `specs` that fit a `pdu_length`-byte PDU.
+    Every range reads into its own bytearray, allocated once and reused on every
+    poll; a range too large for one response is split over several items.
+    Returns (buffers, batches): one bytearray per spec, and a list of (items, owners)
+    pairs, one per read_multi_vars() call, where owners[j] is the spec index item j fills.
+    """
+    # Largest (even) data length one item can carry when it is alone in a response
+    max_chunk = (pdu_length - READ_RESPONSE_HEADER - READ_RESPONSE_ITEM) & ~1
+    max_items = min(MAX_VARS_PER_READ, (pdu_length - READ_REQUEST_HEADER) // READ_REQUEST_ITEM)
+
+    buffers = [bytearray(size) for _, _, size in specs]
+    batches = []
+    pieces = []
+    used = READ_RESPONSE_HEADER
+    for idx, (db, start, size) in enumerate(specs):
+        for offset in range(0, size, max_chunk):
+            amount = min(max_chunk, size - offset)
+            cost = READ_RESPONSE_ITEM + amount + (amount & 1)
+            if pieces and (len(pieces) == max_items or used + cost > pdu_length):
+                batches.append(_make_batch(pieces, buffers))
+                pieces = []
+                used = READ_RESPONSE_HEADER
+            pieces.append((idx, db, start + offset, offset, amount))
+            used += cost
+    if pieces:
+        batches.append(_make_batch(pieces, buffers))
+    return buffers, batches
+
+
+class ClientPool:
+    """
+    A fixed set of connected Clients to one PLC, handed out through an asyncio.Queue.
+    S7-1500 CPUs serve up to 3 requests at once, so requests issued through
+    different members run concurrently instead of queueing behind one connection.
+    A Client is not thread-safe, so each member has its own single worker thread
+    and is only ever used by one request at a time.
+    """
+    def __init__(self, name, ip, rack, slot, tcpport, size, timeouts, max_backoff):
+        self.name = name
+        self.address = (ip, rack, slot, tcpport)
+        self.max_backoff = max_backoff
+        self.members = []
+        self.idle = asyncio.Queue()
+        ping_timeout, send_timeout, recv_timeout = timeouts
+        for i in range(size):
+            client = snap7.client.Client()
+            # libsnap7 already enables TCP_NODELAY and SO_KEEPALIVE on its own socket,
+            # so request/response PDUs are not held back by Nagle. What we can tune are
+            # the timeouts that bound how long a dead link blocks a request.
+            client.set_param(Parameter.PingTimeout, ping_timeout)
+            client.set_param(Parameter.SendTimeout, send_timeout)
+            client.set_param(Parameter.RecvTimeout, recv_timeout)
+            executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"{name}-{i}")
+            self.members.append((client, executor))
+
+    def _call(self, member, method, *args):
+        client, executor = member
+        return asyncio.get_running_loop().run_in_executor(executor, getattr(client, method), *args)
+
+    async def connect(self):
+        """
+        Connect every member, retrying a failed one with the reconnect backoff.
+        Each member joins the pool as soon as it is connected.
+        """
+        async def connect_member(member):
+            try:
+                await self._call(member, "connect", *self.address)
+            except RuntimeError as e:
+                logger.error(f"[{self.name}] Connection error: {e}")
+                await self._reconnect(member)
+            self.idle.put_nowait(member)
+
+        await asyncio.gather(*(connect_member(m) for m in self.members))
+
+    async def _reconnect(self, member):
+        """
+        Drop the member's connection and reconnect, backing off exponentially between
+        attempts. A fresh connection discards any late response still queued from a
+        timed-out request, so the next read cannot be answered with stale data.
+        """
+        delay = 1
+        while True:
+            try:
+                await self._call(member, "disconnect")
+                await self._call(member, "connect", *self.address)
+                if await self._call(member, "get_connected"):
+                    logger.info(f"[{self.name}] Snap7 client reconnected.")
+                    return
+            except RuntimeError as e:
+                logger.error(f"[{self.name}] Reconnect failed: {e}")
+            logger.info(f"[{self.name}] Retrying connection in {delay}s")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.max_backoff)
+
+    async def run(self, method, *args):
+        """
+        Call Client.`method`(*args) on the next idle member. If it fails, the
+        member is reconnected before going back into the pool and the error re-raised.
+        """
+        member = await self.idle.get()
+        try:
+            return await self._call(member, method, *args)
+        except RuntimeError:
+            await self._reconnect(member)
+            raise
+        finally:
+            self.idle.put_nowait(member)
+
+    async def health_check(self, interval):
+        """
+        Every `interval` seconds ping each idle member with a CPU state request
+        and reconnect any that no longer answer, so a dead link is replaced
+        before the poll loop draws it.
+        """
+        while True:
+            await asyncio.sleep(interval)
+            for _ in range(len(self.members)):
+                member = await self.idle.get()
+                try:
+                    await self._call(member, "get_cpu_state")
+                except RuntimeError as e:
+                    logger.warning(f"[{self.name}] Health check failed: {e}; reconnecting")
+                    await self._reconnect(member)
+                finally:
+                    self.idle.put_nowait(member)
+
+    async def close(self):
+        """
+        Disconnect every member on its own worker thread, behind any request still
+        running there, then wait for the threads to exit.
+        """
+        await asyncio.gather(
+            *(self._call(member, "disconnect") for member in self.members),
+            return_exceptions=True,
+        )
+        for _, executor in self.members:
+            executor.shutdown(wait=True)
+
 
-    # --- 2) Create Snap7 client ---
-    client = snap7.client.Client()
+async def poll_plc(name, section):
+    """
+    Connect to the PLC described by config `section` and poll it until cancelled.
+    """
+    ip = section.get("ip", "127.0.0.1")
+    tcpport = section.getint("tcpport", 1102)
+    rack = section.getint("rack", 0)
+    slot = section.getint("slot", 1)
+    db_number = section.getint("db_number", 1)
+    start = section.getint("start", 0)
+    size = section.getint("size", 10)
+    poll_interval = section.getint("poll_interval", 5)
+    max_poll_interval = section.getint("max_poll_interval", 60)
+    extra_reads = parse_read_specs(section.get("extra_reads", ""))
+    # Socket timeouts in ms (libsnap7 defaults: ping 750, send 10, recv 3000)
+    ping_timeout = section.getint("ping_timeout", 750)
+    send_timeout = section.getint("send_timeout", 10)
+    recv_timeout = section.getint("recv_timeout", 3000)
+    pool_size = section.getint("pool_size", 1)
+    health_check_interval = section.getint("health_check_interval", 30)
+
+    # The polled range plus any extra ranges, fetched with multi-variable reads
+    read_specs = [(db_number, start, size)] + extra_reads
+
+    # --- 2) Create a pool of Snap7 clients ---
+    pool = ClientPool(
+        name, ip, rack, slot, tcpport, pool_size,
+        (ping_timeout, send_timeout, recv_timeout), max_poll_interval,
+    )
 
     # 3) Connect to the server
+    logger.info(
+        f"[{name}] Connecting {pool_size} clients to Snap7 server at {ip}:{tcpport}, "
+        f"rack={rack}, slot={slot}"
+    )
+    health_task = None
     try:
-        logger.info(f"Connecting to Snap7 server at {ip}:{tcpport}, rack={rack}, slot={slot}")
-        # The connect_to method includes specifying the TCP port directly.
-        # By default, connect() uses port 102. We can override with connect_to().
-        client.connect(ip, rack, slot, tcpport)
-        if not client.get_connected():
-            logger.error("Failed to connect to the Snap7 server.")
-            sys.exit(1)
-    except Exception as e:
-        logger.error(f"Connection error: {e}")
-        sys.exit(1)
+        # An unreachable PLC is retried with backoff instead of exiting, so the
+        # other PLCs polled by this process are not stopped along with it
+        await pool.connect()
+        logger.info(f"[{name}] Snap7 clients connected.")
+        # Unlike db_read(), read_multi_vars() does not split a read over several PDUs,
+        # so size the batches to the PDU length negotiated with the PLC
+        pdu_length = await pool.run("get_pdu_length")
+        buffers, read_batches = build_read_batches(read_specs, pdu_length)
+        health_task = asyncio.create_task(pool.health_check(health_check_interval))
 
-    logger.info("Snap7 client connected.")
+        # --- 4) Poll in a loop (read, optionally write) ---
+        # Last bytes seen for each range (after our own write-back), to detect outside changes
+        last_seen = [None] * len(read_specs)
+        interval = poll_interval
+        # Wait before retrying a failed poll; doubles while polls keep failing
+        failure_delay = poll_interval
+        # Absolute deadlines keep a steady period regardless of request latency
+        deadline = time.monotonic()
 
-    # --- 4) Poll in a loop (read, optionally write) ---
-    try:
         while True:
-            # Read a range of `size` bytes from DB
-            data = client.db_read(db_number, start, size)
-            logger.info(f"Read from DB{db_number}, bytes[{start}..{start+size-1}]: {list(data)}")
+            try:
+                # Read the `size` byte range (and any extra ranges) in as few PDUs as possible,
+                # spreading the batches over the pool. Wait for every batch, even if one
+                # fails, so no read is still filling a buffer when the next poll starts.
+                outcomes = await asyncio.gather(
+                    *(pool.run("read_multi_vars", items) for items, _ in read_batches),
+                    return_exceptions=True,
+                )
+                for outcome in outcomes:
+                    if isinstance(outcome, BaseException):
+                        raise outcome
+                # Result per range: the first failing item's code, 0 if all its items succeeded
+                results = [0] * len(read_specs)
+                for items, owners in read_batches:
+                    for item, idx in zip(items, owners):
+                        if item.Result != 0 and results[idx] == 0:
+                            results[idx] = item.Result
 
-            # Example: we can also write something back to the server
-            # Let's flip the second byte for fun
-            second_byte_val = data[1]
-            new_val = (second_byte_val + 1) % 256
-            set_byte(data, 1, new_val)
+                changed = False
+                for i, ((db, off, length), buf, result) in enumerate(zip(read_specs, buffers, results)):
+                    if result != 0:
+                        logger.error(f"[{name}] Read from DB{db}, bytes[{off}..{off+length-1}] failed: result=0x{result:x}")
+                        changed = True
+                        continue
+                    if buf != last_seen[i]:
+                        changed = True
+                        last_seen[i] = bytes(buf)
+                        logger.info(f"[{name}] Read from DB{db}, bytes[{off}..{off+length-1}]: {list(buf)}")
 
-            # Write updated data back
-            client.db_write(db_number, start, data)
+                # Example: we can also write something back to the server
+                # Let's flip the second byte for fun
+                buf = buffers[0]
+                if results[0] == 0:
+                    # Patch the read buffer in place; the next poll reads over it anyway
+                    second_byte_val = buf[1]
+                    new_val = (second_byte_val + 1) & 0xFF
+                    buf[1] = new_val
 
-            logger.info(
-                f"Wrote back to DB{db_number}, second byte: {second_byte_val} -> {new_val}"
-            )
+                    # Write updated data back
+                    await pool.run("db_write", db_number, start, buf)
+                    last_seen[0] = bytes(buf)
 
-            time.sleep(poll_interval)
+                    logger.info(
+                        f"[{name}] Wrote back to DB{db_number}, second byte: {second_byte_val} -> {new_val}"
+                    )
+            except RuntimeError as e:
+                # Timeouts / broken links: the pool has already reconnected the
+                # failed client; start over rather than trust a partial poll.
+                # A request the PLC keeps rejecting fails again on the fresh
+                # connection, so back off instead of retrying straight away
+                logger.error(f"[{name}] Snap7 request failed: {e}; retrying in {failure_delay}s")
+                await asyncio.sleep(failure_delay)
+                failure_delay = min(failure_delay * 2, max_poll_interval)
+                last_seen = [None] * len(read_specs)
+                interval = poll_interval
+                deadline = time.monotonic()
+                continue
+
+            failure_delay = poll_interval
+
+            # Back off while nothing else is changing the DB; snap back on any change
+            if changed:
+                interval = poll_interval
+            else:
+                interval = min(interval * 2, max_poll_interval)
+                logger.info(f"[{name}] No external changes, next poll in {interval}s")
+
+            deadline += interval
+            now = time.monotonic()
+            if deadline <= now:
+                # Overran the interval; skip the missed slot and wait a full interval
+                deadline = now + interval
+            await asyncio.sleep(deadline - now)
 
-    except KeyboardInterrupt:
-        logger.info("Snap7 client stopped by user (Ctrl+C).")
     finally:
-        # --- 5) Disconnect client ---
-        if client.get_connected():
-            client.disconnect()
-        logger.info("Snap7 client disconnected.")
+        # --- 5) Disconnect clients ---
+        if health_task is not None:
+            health_task.cancel()
+        await pool.close()
+        logger.info(f"[{name}] Snap7 clients disconnected.")
+
+
+async def run_snap7_client():
+    # --- 1) Load config ---
+    config = configparser.ConfigParser()
+    config.read("snap7_config.ini")
+
+    # [snap7_client] plus any [snap7_client:<name>] sections, one per PLC
+    plc_sections = [
+        name for name in config
+        if name == "snap7_client" or name.startswith("snap7_client:")
+    ]
+    if not plc_sections:
+        logger.error("Missing [snap7_client] section in snap7_config.ini")
+        sys.exit(1)
+
+    await asyncio.gather(*(poll_plc(name, config[name]) for name in plc_sections))
 
 
 if __name__ == "__main__":
-    run_snap7_client()
+    try:
+        asyncio.run(run_snap7_client())
+    except KeyboardInterrupt:
+        logger.info("Snap7 client stopped by user (Ctrl+C).")
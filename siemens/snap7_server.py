@@ -5,13 +5,14 @@ A simple Snap7-based server to simulate a Siemens S7 PLC.
 """
 import logging
 import configparser
+import signal
 import sys
+import threading
 import time
-from ctypes import create_string_buffer
+from ctypes import c_ubyte, create_string_buffer
 
 import snap7
 from snap7.server import Server as Snap7Server
-from snap7.util import set_byte
 from snap7.type import SrvArea
 
 logging.basicConfig(level=logging.INFO)
@@ -23,17 +24,21 @@ def run_snap7_server():
     config = configparser.ConfigParser()
     config.read("snap7_config.ini")
 
-    if not config.has_section("snap7_server"):
+    if "snap7_server" not in config:
         logger.error("Missing [snap7_server] section in snap7_config.ini")
         sys.exit(1)
 
-    ip = config["snap7_server"].get("ip", "127.0.0.1")
-    tcpport = config["snap7_server"].getint("tcpport", 1102)
-    db_number = config["snap7_server"].getint("db_number", 1)
-    db_size = config["snap7_server"].getint("db_size", 256)
-    update_interval = config["snap7_server"].getint("update_interval", 5)
+    server_cfg = config["snap7_server"]
+
+    ip = server_cfg.get("ip", "127.0.0.1")
+    tcpport = server_cfg.getint("tcpport", 1102)
+    db_number = server_cfg.getint("db_number", 1)
+    db_size = server_cfg.getint("db_size", 256)
+    update_interval = server_cfg.getint("update_interval", 5)
     # Create a ctypes string buffer instead of a Python bytearray
     db_buffer = create_string_buffer(db_size)
+    # Byte view over the same memory libsnap7 serves, so updates need no get/set copies
+    db_view = memoryview((c_ubyte * db_size).from_buffer(db_buffer)).cast("B")
 
     # --- 2) Create Snap7 server ---
     server = Snap7Server()
@@ -55,23 +60,39 @@ def run_snap7_server():
     # You can also do `server.start()` if you only want to listen on 0.0.0.0:102 (or whatever default port).
     # For custom IP/port, we use `start_to(ip, tcpport)`.
 
-    # --- 4) Periodically update data in the DB to simulate changes ---
-    try:
-        while True:
-            # Example: Write incremental data each cycle
-            # data = server.get_db(db_number)
-            # # Let's set the first byte to some changing value:
-            # current_val = data[0]
-            # new_val = (current_val + 1) % 256
-            # set_byte(data, 0, new_val)
-            # server.set_db(db_number, data)
+    # --- 4) Periodically update data in the DB until Ctrl+C / SIGTERM ---
+    # libsnap7 serves clients on its own threads; between updates the main
+    # thread parks on the event.
+    stop = threading.Event()
 
-            # logger.info(f"Updated DB{db_number} first byte: {current_val} -> {new_val}")
+    def on_shutdown_signal(signum, frame):
+        logger.info(f"Received {signal.Signals(signum).name}, stopping Snap7 server.")
+        stop.set()
 
-            time.sleep(update_interval)
+    signal.signal(signal.SIGINT, on_shutdown_signal)
+    signal.signal(signal.SIGTERM, on_shutdown_signal)
 
-    except KeyboardInterrupt:
-        logger.info("Received Ctrl+C, stopping Snap7 server.")
+    # Absolute deadlines keep a steady period regardless of update latency
+    deadline = time.monotonic() + update_interval
+    try:
+        while not stop.wait(max(0.0, deadline - time.monotonic())):
+            # Example: Write incremental data each cycle, straight into the served buffer.
+            # Lock the area so a client read in progress never sees a half-done update.
+            server.lock_area(SrvArea.DB, db_number)
+            try:
+                current_val = db_view[0]
+                new_val = (current_val + 1) & 0xFF
+                db_view[0] = new_val
+            finally:
+                server.unlock_area(SrvArea.DB, db_number)
+
+            logger.info(f"Updated DB{db_number} first byte: {current_val} -> {new_val}")
+
+            deadline += update_interval
+            now = time.monotonic()
+            if deadline <= now:
+                # Overran the update_interval; skip the missed slot
+                deadline = now + update_interval
     finally:
         server.stop()
         server.destroy()
@@ -2,134 +2,198 @@
 """
 mqtt_sub.py
 A simple MQTT subscriber that reads settings from 'mqtt_config.ini'.
-Subscribes to a given topic and logs incoming messages.
+Subscribes to a given topic from an asyncio event loop (aiomqtt) and logs incoming
+Sparkplug B messages; payloads are decoded on a thread pool so receiving continues.
+A lost broker connection is re-established, and the topic re-subscribed, with exponential backoff.
 """
-import sys
-sys.path.insert(0, "../core/")
-
+import asyncio
 import logging
 import configparser
+import operator
+import os
 import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
-import paho.mqtt.client as mqtt
-import sparkplug_b as sparkplug
-from sparkplug_b import *
+# The generated protobuf module lives in ../core (not an installed package);
+# resolve it from this file so the script also runs from another directory
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "core"))
+
+import aiomqtt
+from google.protobuf.internal import api_implementation
+import sparkplug_b_pb2
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Upper bound in seconds for the wait between reconnect attempts
+MAX_RECONNECT_DELAY = 60
+
+
+# Metric value field for each supported Sparkplug B datatype, so decoding a
+# metric is one dict lookup instead of a chain of comparisons
+_ACCESS = {
+    sparkplug_b_pb2.String: operator.attrgetter("string_value"),
+    sparkplug_b_pb2.Int32: operator.attrgetter("int_value"),
+    sparkplug_b_pb2.Float: operator.attrgetter("float_value"),
+    sparkplug_b_pb2.Boolean: operator.attrgetter("boolean_value"),
+}
+
+# Per-thread state for _handle_payload (one reusable Payload per executor thread)
+_local = threading.local()
+
+
+def _handle_payload(topic, payload):
+    """
+    Decode and log one Sparkplug B payload. Runs on an executor thread, reusing
+    that thread's Payload message instead of allocating a new one per message.
+    """
+    logger.info("Received Sparkplug B message on topic='%s'", topic)
+
+    # 1) Take this thread's Payload() object from sparkplug_b_pb2
+    sparkplug_msg = getattr(_local, "payload", None)
+    if sparkplug_msg is None:
+        sparkplug_msg = _local.payload = sparkplug_b_pb2.Payload()
+
+    # 2) Parse the raw binary payload from the MQTT message
+    # (ParseFromString clears the message first, so nothing leaks from the last one)
+    try:
+        sparkplug_msg.ParseFromString(payload)
+    except Exception as e:
+        logger.error(f"Failed to parse Sparkplug B Protobuf: {e}")
+        return
+
+    # 3) Access typical Sparkplug B fields
+    seq = sparkplug_msg.seq
+    uuid = sparkplug_msg.uuid
+    timestamp = sparkplug_msg.timestamp
+    # bdSeq = sparkplug_msg.bdSeq  # used in Birth messages
+    metrics = sparkplug_msg.metrics
+
+    logger.info("  seq=%s, uuid=%s, timestamp=%s", seq, uuid, timestamp)
+    # logger.info(f"  seq={seq}, uuid={uuid}, timestamp={timestamp}, bdSeq={bdSeq}")
+    # Rendering the metrics repr walks every metric, so only do it when DEBUG is on
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("  seq=%s, uuid=%s, timestamp=%s, metrics=%s", seq, uuid, timestamp, metrics)
+
+    # 4) Look at the Metrics (per-metric records are DEBUG-only as well)
+    if logger.isEnabledFor(logging.DEBUG):
+        for metric in metrics:
+            # Depending on the datatype, retrieve the appropriate value
+            access = _ACCESS.get(metric.datatype)
+            if access is not None:
+                val = access(metric)
+            else:
+                # Catch-all for other Sparkplug data types
+                val = f"Unsupported datatype: {metric.datatype}"
+
+            logger.debug("  - Metric: name=%s, type=%s, value=%s", metric.name, metric.datatype, val)
+
+
+async def run_subscriber():
+    # Payload decoding dominates per-message cost; the native (upb/cpp) protobuf
+    # backend is many times faster than the pure-Python fallback
+    if api_implementation.Type() == "python":
+        logger.warning(
+            "protobuf is using the pure-Python implementation; install a protobuf "
+            "wheel with the upb/cpp backend for much faster Sparkplug B decoding"
+        )
 
-def run_subscriber():
     # 1) Load config
     config = configparser.ConfigParser()
     config.read("mqtt_config.ini")
 
-    if not config.has_section("mqtt_broker"):
+    if "mqtt_broker" not in config:
         logger.error("Missing [mqtt_broker] section in mqtt_config.ini")
         sys.exit(1)
 
     # Extract MQTT broker settings
-    broker_host = config["mqtt_broker"].get("host", "localhost")
-    broker_port = config["mqtt_broker"].getint("port", 1883)
-    username = config["mqtt_broker"].get("username", "")
-    password = config["mqtt_broker"].get("password", "")
-    clean_session_str = config["mqtt_broker"].get("clean_session", "true")
+    broker_cfg = config["mqtt_broker"]
+    broker_host = broker_cfg.get("host", "localhost")
+    broker_port = broker_cfg.getint("port", 1883)
+    username = broker_cfg.get("username", "")
+    password = broker_cfg.get("password", "")
+    clean_session_str = broker_cfg.get("clean_session", "true")
     clean_session = clean_session_str.lower() == "true"
 
-    qos = config["mqtt_broker"].getint("qos", 0)
+    qos = broker_cfg.getint("qos", 0)
 
-    if not config.has_section("subscriber"):
+    if "subscriber" not in config:
         logger.error("Missing [subscriber] section in mqtt_config.ini")
         sys.exit(1)
 
     # Subscriber section
-    sub_topic = config["subscriber"].get("topic", "my/test/topic")
-
-    # 2) Create MQTT client
-    client = mqtt.Client()
-
-    # Set username/password if provided
-    if username:
-        client.username_pw_set(username, password=password)
-
-    # 3) Define callbacks
-    def on_connect(client, userdata, flags, rc):
-        if rc == 0:
-            logger.info(f"Connected to MQTT broker at {broker_host}:{broker_port}, subscribing to '{sub_topic}'")
-            client.subscribe(sub_topic, qos=qos)
-        else:
-            logger.error(f"Failed to connect, return code={rc}")
-
-    # def on_message(client, userdata, msg):
-    #     logger.info(f"Received message on topic='{msg.topic}': {msg.payload}")
-
-    def on_message(client, userdata, msg):
-        """Called when a PUBLISH message is received from the server."""
-        logger.info(f"Received Sparkplug B message on topic='{msg.topic}'")
-
-        # 1) Create a new Payload() object from sparkplug_b_pb2
-        sparkplug_msg = sparkplug_b_pb2.Payload()
-        print(sparkplug_msg)
-
-        # 2) Parse the raw binary payload from the MQTT message
+    sub_cfg = config["subscriber"]
+    sub_topic = sub_cfg.get("topic", "my/test/topic")
+    # Optional shared subscription: the broker spreads the topic's messages
+    # across every subscriber in the same group instead of copying them to each
+    share_group = sub_cfg.get("share_group", "")
+    if share_group:
+        sub_topic = f"$share/{share_group}/{sub_topic}"
+    # Received messages the client buffers for us; further ones are dropped until there is room
+    max_queued_messages = sub_cfg.getint("max_queued_messages", 1000)
+
+    # 2) Define the message handler
+    # Decode/log on a bounded pool so parsing runs in parallel off the event loop
+    workers = os.cpu_count() or 1
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="spb-decode")
+    # At most this many messages are being decoded or waiting for a worker;
+    # beyond that the receive loop waits instead of piling up tasks
+    in_flight = asyncio.Semaphore(workers * 4)
+    # Handler tasks still running; the event loop only keeps weak references to tasks
+    pending = set()
+
+    async def handle(msg):
+        # Decode in a worker thread so a large payload doesn't hold up the
+        # messages queued behind it
         try:
-            sparkplug_msg.ParseFromString(msg.payload)
-        except Exception as e:
-            logger.error(f"Failed to parse Sparkplug B Protobuf: {e}")
-            return
-
-        # 3) Access typical Sparkplug B fields
-        seq = sparkplug_msg.seq
-        uuid = sparkplug_msg.uuid
-        timestamp = sparkplug_msg.timestamp
-        # bdSeq = sparkplug_msg.bdSeq  # used in Birth messages
-        metrics = sparkplug_msg.metrics
-
-        logger.info(f"  seq={seq}, uuid={uuid}, timestamp={timestamp}, metrics={metrics}")
-        # logger.info(f"  seq={seq}, uuid={uuid}, timestamp={timestamp}, bdSeq={bdSeq}")
-
-        # 4) Look at the Metrics
-        # for metric in sparkplug_msg.metrics:
-            
-        #     metric_name = metric.name
-        #     print
-        #     metric_type = metric.datatype  # e.g., 0=Invalid, 1=Float, 2=Double, etc.
-        #     # Depending on the datatype, retrieve the appropriate value
-        #     if metric.datatype == sparkplug_b_pb2.Payload.Metric.STRING:
-        #         val = metric.string_value
-        #     elif metric.datatype == sparkplug_b_pb2.Payload.Metric.INT32:
-        #         val = metric.int_value
-        #     elif metric.datatype == sparkplug_b_pb2.Payload.Metric.FLOAT:
-        #         val = metric.float_value
-        #     elif metric.datatype == sparkplug_b_pb2.Payload.Metric.BOOLEAN:
-        #         val = metric.boolean_value
-        #     else:
-        #         # Catch-all for other Sparkplug data types
-        #         val = f"Unsupported datatype: {metric.datatype}"
-
-        #     logger.info(f"  - Metric: name={metric_name}, type={metric.datatype}, value={val}")
-
-    
-    client.on_connect = on_connect
-    client.on_message = on_message
-
-    # 4) Connect to broker
-    try:
-        logger.info(f"Connecting to {broker_host}:{broker_port}, clean_session={clean_session}, qos={qos}")
-        client.connect(broker_host, broker_port, keepalive=60)
-    except Exception as e:
-        logger.error(f"Error connecting to broker: {e}")
-        sys.exit(1)
-
-    # 5) Blocking network loop
+            await asyncio.get_running_loop().run_in_executor(
+                executor, _handle_payload, msg.topic, msg.payload
+            )
+        finally:
+            in_flight.release()
+
+    # 3) Connect to broker, reconnecting (and re-subscribing) with exponential
+    # backoff if the link drops; the decode pool is kept across reconnects
+    delay = 1
     try:
-        client.loop_forever()
-    except KeyboardInterrupt:
-        logger.info("Subscriber stopped by user (Ctrl+C).")
+        while True:
+            logger.info(f"Connecting to {broker_host}:{broker_port}, clean_session={clean_session}, qos={qos}")
+            try:
+                async with aiomqtt.Client(
+                    broker_host,
+                    port=broker_port,
+                    username=username or None,
+                    password=password or None,
+                    clean_session=clean_session,
+                    keepalive=60,
+                    max_queued_incoming_messages=max_queued_messages,
+                    # Route aiomqtt/paho log output through our logging config
+                    logger=logger,
+                ) as client:
+                    logger.info(f"Connected to MQTT broker at {broker_host}:{broker_port}, subscribing to '{sub_topic}'")
+                    await client.subscribe(sub_topic, qos=qos)
+                    delay = 1
+
+                    # 4) Handle each message in its own task, so decoding one does not
+                    # stop the socket from draining the next
+                    async for msg in client.messages:
+                        await in_flight.acquire()
+                        task = asyncio.create_task(handle(msg))
+                        pending.add(task)
+                        task.add_done_callback(pending.discard)
+            except aiomqtt.MqttError as e:
+                # Raised for a failed connect as well as for a link lost mid-run; either
+                # way the client has been torn down, so start over on a fresh connection
+                logger.error(f"MQTT error: {e}; reconnecting in {delay}s")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, MAX_RECONNECT_DELAY)
     finally:
-        client.disconnect()
-        logger.info("MQTT subscriber disconnected.")
+        executor.shutdown(wait=False, cancel_futures=True)
 
 
 if __name__ == "__main__":
-    run_subscriber()
+    try:
+        asyncio.run(run_subscriber())
+    except KeyboardInterrupt:
+        logger.info("Subscriber stopped by user (Ctrl+C).")